@@ -2,6 +2,7 @@
 Utilities to manipulate template
 """
 import itertools
+import json
 import os
 import pathlib
 
@@ -69,6 +70,8 @@ def move_template(src_template_path, dest_template_path, template_dict):
     You must use this method if you are reading a template from one location, modifying it, and writing it back to a
     different location.
 
+    Template is written in JSON format if ``dest_template_path`` has ``.json`` extension, and in YAML format otherwise.
+
     Parameters
     ----------
     src_template_path : str
@@ -91,8 +94,23 @@ def move_template(src_template_path, dest_template_path, template_dict):
     # if a stack only has image functions, the directory for that directory won't be created.
     # here we make sure the directory the destination template file to write to exists.
     os.makedirs(os.path.dirname(dest_template_path), exist_ok=True)
-    with open(dest_template_path, "w") as fp:
-        fp.write(yaml_dump(modified_template))
+    if dest_template_path.endswith(".json"):
+        template_str = json.dumps(modified_template, indent=4)
+    else:
+        template_str = yaml_dump(modified_template)
+
+    # write into a temporary file first and replace the destination with it, so that the destination is never
+    # left with a partially written template
+    temp_template_path = f"{dest_template_path}.tmp"
+    try:
+        with open(temp_template_path, "w") as fp:
+            fp.write(template_str)
+        os.replace(temp_template_path, dest_template_path)
+    except BaseException:
+        # don't leave the temporary file behind if writing or replacing fails (or is interrupted)
+        if os.path.exists(temp_template_path):
+            os.remove(temp_template_path)
+        raise
 
 
 def _update_relative_paths(template_dict, original_root, new_root):
@@ -1,21 +1,26 @@
 """
 nested stack manager to generate nested stack information and update original template with it
 """
+import copy
+import json
 import logging
 import os
 import shutil
-from copy import deepcopy
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, cast
+from typing import Dict, FrozenSet, List, Optional, Tuple, cast
 
 from samcli.commands._utils.template import move_template
 from samcli.lib.bootstrap.nested_stack.nested_stack_builder import NestedStackBuilder
 from samcli.lib.build.app_builder import ApplicationBuildResult
+from samcli.lib.build.build_graph import FunctionBuildDefinition
 from samcli.lib.build.workflow_config import get_layer_subfolder
 from samcli.lib.providers.provider import Stack, Function
 from samcli.lib.providers.sam_function_provider import SamFunctionProvider
-from samcli.lib.sync.exceptions import InvalidRuntimeDefinitionForFunction
+from samcli.lib.sync.exceptions import InvalidLayersDefinitionForFunction, InvalidRuntimeDefinitionForFunction
 from samcli.lib.utils import osutils
+from samcli.lib.utils.hash import str_checksum
 from samcli.lib.utils.osutils import BUILD_DIR_PERMISSIONS
 from samcli.lib.utils.packagetype import ZIP
 from samcli.lib.utils.resources import AWS_SERVERLESS_FUNCTION, AWS_LAMBDA_FUNCTION
@@ -31,6 +36,17 @@ SUPPORTED_RESOURCES = {AWS_SERVERLESS_FUNCTION, AWS_LAMBDA_FUNCTION}
 # Languages which we support creating dependency layer
 SUPPORTED_LANGUAGES = ("python", "nodejs", "java")
 
+# ZIP functions of the recently processed templates, keyed by template checksum, stack name and stack location.
+# Same template is processed again and again during sync, so function discovery is done only once for it
+_ZIP_FUNCTIONS_CACHE: "OrderedDict[Tuple[str, str, str], Tuple[Function, ...]]" = OrderedDict()
+_ZIP_FUNCTIONS_CACHE_SIZE = 8
+
+# Suffix of the file which stores the list of dependency files that a layer folder is created from
+LAYER_MANIFEST_FILE_SUFFIX = ".manifest"
+
+# Maximum number of threads which prepare layer folders in parallel
+MAX_LAYER_FOLDER_WORKERS = 8
+
 
 class NestedStackManager:
 
@@ -40,6 +56,8 @@ class NestedStackManager:
     _current_template: Dict
     _app_build_result: ApplicationBuildResult
     _nested_stack_builder: NestedStackBuilder
+    _function_build_definitions: Optional[Dict[str, FunctionBuildDefinition]]
+    _built_artifact_ids: FrozenSet[str]
 
     def __init__(
         self,
@@ -69,6 +87,8 @@ class NestedStackManager:
         self._current_template = current_template
         self._app_build_result = app_build_result
         self._nested_stack_builder = NestedStackBuilder()
+        self._function_build_definitions = None
+        self._built_artifact_ids = frozenset(app_build_result.artifacts)
 
     def generate_auto_dependency_layer_stack(self) -> Dict:
         """
@@ -76,14 +96,17 @@ class NestedStackManager:
         creates layer for its dependencies in a nested stack, and adds reference of the nested stack back to original
         stack
         """
-        template = deepcopy(self._current_template)
-        resources = template.get("Resources", {})
+        # only the resources which are going to be updated are copied (see _add_layer_references),
+        # rest of the template is shared with the original one
+        # (copy.copy keeps the OrderedDict type of the parsed template, so that yaml_dump keeps the key order)
+        template = copy.copy(self._current_template)
+        resources = copy.copy(template.get("Resources", {}))
+        if "Resources" in template:
+            template["Resources"] = resources
 
-        stack = Stack("", self._stack_name, self._stack_location, {}, template_dict=template)
-        function_provider = SamFunctionProvider([stack], ignore_code_extraction_warnings=True)
-        zip_functions = [function for function in function_provider.get_all() if function.packagetype == ZIP]
-
-        for zip_function in zip_functions:
+        functions: List[Function] = []
+        dependencies_dirs: List[str] = []
+        for zip_function in self._get_zip_functions():
             if not self._is_function_supported(zip_function):
                 continue
 
@@ -95,13 +118,26 @@ class NestedStackManager:
                 )
                 continue
 
-            self._add_layer(dependencies_dir, zip_function, resources)
+            functions.append(zip_function)
+            dependencies_dirs.append(dependencies_dir)
+
+        layer_references: Dict[str, List[Dict]] = defaultdict(list)
+        if functions:
+            # layer folders are prepared in parallel since it is mostly I/O bound, template is updated
+            # in this thread with the results in the original order of the functions
+            with ThreadPoolExecutor(max_workers=min(MAX_LAYER_FOLDER_WORKERS, len(functions))) as executor:
+                layer_locations = executor.map(self._update_layer_folder_for_function, functions, dependencies_dirs)
+                for function, layer_location in zip(functions, layer_locations):
+                    layer_references[function.name].append(self._add_layer(layer_location, function))
+
+        for function_name, function_layer_references in layer_references.items():
+            self._add_layer_references(function_name, function_layer_references, resources)
 
         if not self._nested_stack_builder.is_any_function_added():
             LOG.debug("No function has been added for auto dependency layer creation")
             return template
 
-        nested_template_location = os.path.join(self._build_dir, "nested_template.yaml")
+        nested_template_location = os.path.join(self._build_dir, "nested_template.json")
         move_template(self._stack_location, nested_template_location, self._nested_stack_builder.build_as_dict())
 
         resources[NESTED_STACK_NAME] = self._nested_stack_builder.get_nested_stack_reference_resource(
@@ -109,28 +145,72 @@ class NestedStackManager:
         )
         return template
 
-    def _add_layer(self, dependencies_dir: str, function: Function, resources: Dict):
+    def _get_zip_functions(self) -> Tuple[Function, ...]:
+        """
+        Returns ZIP functions of the current template, results are cached by the checksum of the template
+        """
+        cache_key = (
+            str_checksum(json.dumps(self._current_template, default=str)),
+            self._stack_name,
+            self._stack_location,
+        )
+        zip_functions = _ZIP_FUNCTIONS_CACHE.get(cache_key)
+        if zip_functions is not None:
+            _ZIP_FUNCTIONS_CACHE.move_to_end(cache_key)
+            return zip_functions
+
+        stack = Stack("", self._stack_name, self._stack_location, {}, template_dict=self._current_template)
+        function_provider = SamFunctionProvider([stack], ignore_code_extraction_warnings=True)
+        zip_functions = tuple(function for function in function_provider.get_all() if function.packagetype == ZIP)
+
+        _ZIP_FUNCTIONS_CACHE[cache_key] = zip_functions
+        if len(_ZIP_FUNCTIONS_CACHE) > _ZIP_FUNCTIONS_CACHE_SIZE:
+            _ZIP_FUNCTIONS_CACHE.popitem(last=False)
+        return zip_functions
+
+    def _update_layer_folder_for_function(self, function: Function, dependencies_dir: str) -> str:
         layer_logical_id = NestedStackBuilder.get_layer_logical_id(function.name)
-        layer_location = self.update_layer_folder(
+        return self.update_layer_folder(
             self._build_dir, dependencies_dir, layer_logical_id, function.name, function.runtime
         )
 
+    def _add_layer(self, layer_location: str, function: Function) -> Dict:
+        """
+        Adds layer of the function into nested stack and returns the reference of it
+        """
         layer_output_key = self._nested_stack_builder.add_function(self._stack_name, layer_location, function)
+        return {"Fn::GetAtt": [NESTED_STACK_NAME, f"Outputs.{layer_output_key}"]}
 
-        # add layer reference back to function
-        function_properties = cast(Dict, resources.get(function.name)).get("Properties", {})
+    @staticmethod
+    def _add_layer_references(
+        function_name: str, function_layer_references: List[Dict], resources: Dict[str, Dict]
+    ) -> None:
+        """
+        Adds layer references back to function, function resource is copied before updating it
+        so that the original template stays untouched
+        """
+        function_resource = resources[function_name] = copy.copy(resources[function_name])
+        function_properties = function_resource["Properties"] = copy.copy(function_resource.get("Properties", {}))
         function_layers = function_properties.get("Layers", [])
-        function_layers.append({"Fn::GetAtt": [NESTED_STACK_NAME, f"Outputs.{layer_output_key}"]})
-        function_properties["Layers"] = function_layers
+        if not isinstance(function_layers, list):
+            # e.g. Layers is defined with an intrinsic function, layer references can't be added into it
+            raise InvalidLayersDefinitionForFunction(function_name)
+        function_properties["Layers"] = function_layers + function_layer_references
 
     @staticmethod
-    def _add_layer_readme_info(dependencies_dir: str, function_name: str):
+    def _add_layer_readme_info(dependencies_dir: str, function_name: str) -> None:
         # add a simple README file for discoverability
-        with open(os.path.join(dependencies_dir, "AWS_SAM_CLI_README"), "w+") as f:
-            f.write(
+        readme_file = os.open(
+            os.path.join(dependencies_dir, "AWS_SAM_CLI_README"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+        )
+        try:
+            os.write(
+                readme_file,
                 f"This layer contains dependencies of function {function_name} "
-                "and automatically added by AWS SAM CLI command 'sam sync'"
+                "and automatically added by AWS SAM CLI command 'sam sync'".encode("utf-8"),
             )
+        finally:
+            os.close(readme_file)
 
     @staticmethod
     def update_layer_folder(
@@ -148,21 +228,116 @@ class NestedStackManager:
             raise InvalidRuntimeDefinitionForFunction(function_logical_id)
 
         layer_root_folder = Path(build_dir).joinpath(layer_logical_id)
-        if layer_root_folder.exists():
-            shutil.rmtree(layer_root_folder)
-        layer_contents_folder = layer_root_folder.joinpath(get_layer_subfolder(function_runtime))
-        layer_contents_folder.mkdir(BUILD_DIR_PERMISSIONS, parents=True)
-        if os.path.isdir(dependencies_dir):
-            osutils.copytree(dependencies_dir, str(layer_contents_folder))
+        layer_subfolder = get_layer_subfolder(function_runtime)
+        layer_contents_folder = layer_root_folder.joinpath(layer_subfolder)
+
+        # manifest is stored outside of the layer folder, so that it is not packaged into the layer
+        manifest_file = Path(build_dir).joinpath(f"{layer_logical_id}{LAYER_MANIFEST_FILE_SUFFIX}")
+        dependency_files = NestedStackManager._get_dependency_files(dependencies_dir)
+        manifest = {"LayerSubfolder": layer_subfolder, "Files": dependency_files}
+        previous_manifest = (
+            NestedStackManager._read_layer_manifest(manifest_file) if layer_root_folder.exists() else None
+        )
+
+        if previous_manifest == manifest:
+            LOG.debug(
+                "Dependencies of %s haven't changed, re-using layer folder %s", function_logical_id, layer_root_folder
+            )
+            return str(layer_root_folder)
+
+        file_linker = osutils.FileLinker()
+        if previous_manifest and previous_manifest.get("LayerSubfolder") == layer_subfolder:
+            # only update the files which are changed since the last time
+            NestedStackManager._update_layer_contents(
+                dependencies_dir,
+                str(layer_contents_folder),
+                previous_manifest.get("Files", {}),
+                dependency_files,
+                file_linker,
+            )
+        else:
+            if layer_root_folder.exists():
+                shutil.rmtree(layer_root_folder)
+            layer_contents_folder.mkdir(BUILD_DIR_PERMISSIONS, parents=True)
+            if os.path.isdir(dependencies_dir):
+                osutils.copytree(dependencies_dir, str(layer_contents_folder), copy_function=file_linker)
         NestedStackManager._add_layer_readme_info(str(layer_root_folder), function_logical_id)
+        manifest_file.write_text(json.dumps(manifest))
         return str(layer_root_folder)
 
-    def _is_function_supported(self, function: Function):
+    @staticmethod
+    def _get_dependency_files(dependencies_dir: str) -> Dict[str, List[int]]:
+        """
+        Returns relative paths of the files in dependencies folder, with their sizes, modification times and
+        inode/device numbers, so that a file which is replaced with the same size and modification time is still
+        detected as changed
+        """
+        dependency_files = {}
+        for root, _, files in os.walk(dependencies_dir, followlinks=True):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                file_stat = os.stat(file_path)
+                dependency_files[os.path.relpath(file_path, dependencies_dir)] = [
+                    file_stat.st_size,
+                    file_stat.st_mtime_ns,
+                    file_stat.st_ino,
+                    file_stat.st_dev,
+                ]
+        return dependency_files
+
+    @staticmethod
+    def _read_layer_manifest(manifest_file: Path) -> Optional[Dict]:
+        if not manifest_file.exists():
+            return None
+        try:
+            return cast(Dict, json.loads(manifest_file.read_text()))
+        except ValueError as ex:
+            LOG.debug("Unable to read layer manifest %s", manifest_file, exc_info=ex)
+            return None
+
+    @staticmethod
+    def _update_layer_contents(
+        dependencies_dir: str,
+        layer_contents_folder: str,
+        previous_files: Dict[str, List[int]],
+        files: Dict[str, List[int]],
+        file_linker: osutils.FileLinker,
+    ) -> None:
+        """
+        Removes the files which don't exist in dependencies folder anymore from layer contents folder,
+        and links (or copies) the new and changed files into it. Unchanged files are left as they are.
+        """
+        for removed_file in previous_files.keys() - files.keys():
+            removed_file_path = os.path.join(layer_contents_folder, removed_file)
+            if os.path.lexists(removed_file_path):
+                os.remove(removed_file_path)
+
+            # clean up the folders which became empty
+            parent_folder = os.path.dirname(removed_file_path)
+            while parent_folder != layer_contents_folder:
+                try:
+                    os.rmdir(parent_folder)
+                except OSError:
+                    break
+                parent_folder = os.path.dirname(parent_folder)
+
+        for file, file_stat in files.items():
+            layer_file_path = os.path.join(layer_contents_folder, file)
+            if previous_files.get(file) == file_stat and os.path.exists(layer_file_path):
+                continue
+
+            # remove the previous file instead of overwriting it, since it may be a hard link to a dependency file
+            if os.path.lexists(layer_file_path):
+                os.remove(layer_file_path)
+            os.makedirs(os.path.dirname(layer_file_path), exist_ok=True)
+            file_linker(os.path.join(dependencies_dir, file), layer_file_path)
+
+    def _is_function_supported(self, function: Function) -> bool:
         """
         Checks if function is built with current session and its runtime is supported
         """
         # check if function is built
-        if function.name not in self._app_build_result.artifacts.keys():
+        if function.name not in self._built_artifact_ids:
             LOG.debug(
                 "Function %s is not built within SAM CLI, skipping for auto dependency layer creation",
                 function.name,
@@ -187,8 +362,12 @@ class NestedStackManager:
         """
         Returns dependency directory information for function
         """
-        function_build_definition = self._app_build_result.build_graph.get_function_build_definition_with_logical_id(
-            function_logical_id
-        )
+        if self._function_build_definitions is None:
+            # function build definitions are indexed once, instead of searching the build graph for each function
+            self._function_build_definitions = {}
+            for build_definition in self._app_build_result.build_graph.get_function_build_definitions():
+                for function in build_definition.functions:
+                    self._function_build_definitions.setdefault(function.name, build_definition)
 
+        function_build_definition = self._function_build_definitions.get(function_logical_id)
         return function_build_definition.dependencies_dir if function_build_definition else None
@@ -86,6 +86,27 @@ PROVIDED_MAKE_CONFIG = CONFIG(
     executable_search_paths=None,
 )
 
+LAYER_SUBFOLDERS_BY_RUNTIME = {
+    "python2.7": "python",
+    "python3.6": "python",
+    "python3.7": "python",
+    "python3.8": "python",
+    "python3.9": "python",
+    "nodejs4.3": "nodejs",
+    "nodejs6.10": "nodejs",
+    "nodejs8.10": "nodejs",
+    "nodejs10.x": "nodejs",
+    "nodejs12.x": "nodejs",
+    "nodejs14.x": "nodejs",
+    "ruby2.5": "ruby/lib",
+    "ruby2.7": "ruby/lib",
+    "java8": "java",
+    "java11": "java",
+    "java8.al2": "java",
+    # User is responsible for creating subfolder in these workflows
+    "makefile": "",
+}
+
 
 class UnsupportedRuntimeException(Exception):
     pass
@@ -146,31 +167,10 @@ def get_selector(
 
 
 def get_layer_subfolder(build_workflow: str) -> str:
-    subfolders_by_runtime = {
-        "python2.7": "python",
-        "python3.6": "python",
-        "python3.7": "python",
-        "python3.8": "python",
-        "python3.9": "python",
-        "nodejs4.3": "nodejs",
-        "nodejs6.10": "nodejs",
-        "nodejs8.10": "nodejs",
-        "nodejs10.x": "nodejs",
-        "nodejs12.x": "nodejs",
-        "nodejs14.x": "nodejs",
-        "ruby2.5": "ruby/lib",
-        "ruby2.7": "ruby/lib",
-        "java8": "java",
-        "java11": "java",
-        "java8.al2": "java",
-        # User is responsible for creating subfolder in these workflows
-        "makefile": "",
-    }
-
-    if build_workflow not in subfolders_by_runtime:
+    if build_workflow not in LAYER_SUBFOLDERS_BY_RUNTIME:
         raise UnsupportedRuntimeException("'{}' runtime is not supported for layers".format(build_workflow))
 
-    return subfolders_by_runtime[build_workflow]
+    return LAYER_SUBFOLDERS_BY_RUNTIME[build_workflow]
 
 
 def get_workflow_config(
@@ -9,7 +9,8 @@ rich public interface.
 
 import copy
 import functools
-from typing import Dict
+from collections import OrderedDict
+from typing import Any, Dict
 
 from samtranslator.model import ResourceTypeResolver, sam_resources
 
@@ -27,6 +28,9 @@ from samtranslator.validator.validator import SamTemplateValidator
 from samcli.commands.validate.lib.exceptions import InvalidSamDocumentException
 from .local_uri_plugin import SupportLocalUriPlugin
 
+# Types which can't contain any other object, so they can be shared between the original and the copied template
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
 
 class SamTranslatorWrapper:
     def __init__(self, sam_template, parameter_values=None, offline_fallback=True):
@@ -75,7 +79,7 @@ class SamTranslatorWrapper:
 
     @property
     def template(self):
-        return copy.deepcopy(self._sam_template)
+        return _naive_deepcopy(self._sam_template)
 
 
 class _SamParserReimplemented:
@@ -116,3 +120,23 @@ class _SamParserReimplemented:
             raise InvalidDocumentException([InvalidTemplateException("'Resources' section is required")])
 
         SamTemplateValidator.validate(sam_template)
+
+
+def _naive_deepcopy(value: Any) -> Any:
+    """
+    Faster alternative of copy.deepcopy for parsed templates. Parsed templates only consist of dict, OrderedDict,
+    list and immutable (str, int, float, bool, None) values, so the type dispatch and memo bookkeeping of
+    copy.deepcopy can be skipped for them. Any other type is still copied with copy.deepcopy.
+
+    Unlike copy.deepcopy, shared references (e.g. YAML anchors) are copied as separate objects.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        return {key: _naive_deepcopy(item) for key, item in value.items()}
+    if value_type is OrderedDict:
+        return OrderedDict((key, _naive_deepcopy(item)) for key, item in value.items())
+    if value_type is list:
+        return [_naive_deepcopy(item) for item in value]
+    if value_type in _IMMUTABLE_TYPES:
+        return value
+    return copy.deepcopy(value)
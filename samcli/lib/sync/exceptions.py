@@ -171,3 +171,19 @@ class InvalidRuntimeDefinitionForFunction(Exception):
     @property
     def function_logical_id(self):
         return self._function_logical_id
+
+
+class InvalidLayersDefinitionForFunction(Exception):
+    """This is used when Layers of a function resource is not a list, so that new layers can't be added into it"""
+
+    _function_logical_id: str
+
+    def __init__(self, function_logical_id: str):
+        super().__init__(
+            f"Layers of {function_logical_id} should be defined as a list to add auto dependency layer into it"
+        )
+        self._function_logical_id = function_logical_id
+
+    @property
+    def function_logical_id(self) -> str:
+        return self._function_logical_id
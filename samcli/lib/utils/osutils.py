@@ -115,7 +115,7 @@ def tempfile_platform_independent():
 
 # NOTE: Py3.8 or higher has a ``dir_exist_ok=True`` parameter to provide this functionality.
 #       This method can be removed if we stop supporting Py37
-def copytree(source, destination, ignore=None):
+def copytree(source, destination, ignore=None, copy_function=shutil.copy2):
     """
     Similar to shutil.copytree except that it removes the limitation that the destination directory should
     be present.
@@ -129,6 +129,10 @@ def copytree(source, destination, ignore=None):
     :param ignore:
         A function that returns a set of file names to ignore, given a list of available file names. Similar to the
         ``ignore`` property of ``shutils.copytree`` method
+    :type copy_function: function
+    :param copy_function:
+        A function which is called with source and destination paths to copy each file. Similar to the
+        ``copy_function`` property of ``shutils.copytree`` method
     """
 
     if not os.path.exists(destination):
@@ -141,24 +145,57 @@ def copytree(source, destination, ignore=None):
             # Can't copy file access times in Windows
             LOG.debug("Unable to copy file access times from %s to %s", source, destination, exc_info=ex)
 
-    names = os.listdir(source)
+    # scandir entries already know whether they are a directory, so each path is not checked separately
+    with os.scandir(source) as scandir_iterator:
+        entries = list(scandir_iterator)
+
     if ignore is not None:
-        ignored_names = ignore(source, names)
+        ignored_names = ignore(source, [entry.name for entry in entries])
     else:
         ignored_names = set()
 
-    for name in names:
+    for entry in entries:
         # Skip ignored names
-        if name in ignored_names:
+        if entry.name in ignored_names:
             continue
 
-        new_source = os.path.join(source, name)
-        new_destination = os.path.join(destination, name)
+        new_destination = os.path.join(destination, entry.name)
 
-        if os.path.isdir(new_source):
-            copytree(new_source, new_destination, ignore=ignore)
+        if entry.is_dir():
+            copytree(entry.path, new_destination, ignore=ignore, copy_function=copy_function)
         else:
-            shutil.copy2(new_source, new_destination)
+            copy_function(entry.path, new_destination)
+
+
+class FileLinker:
+    """
+    Creates hard links of the given files, and falls back to copying them if a hard link can't be created
+    (e.g. source and destination are in different file systems). After the first failure, rest of the files are
+    copied directly instead of trying to link each of them again.
+
+    It can be used as ``copy_function`` of copytree
+    """
+
+    def __init__(self) -> None:
+        self._link_files = True
+
+    def __call__(self, source: str, destination: str) -> None:
+        """
+        Parameters
+        ----------
+        source : str
+            Path to the source file
+        destination : str
+            Path to the destination file, which shouldn't exist
+        """
+        if self._link_files:
+            try:
+                os.link(source, destination)
+                return
+            except OSError as ex:
+                LOG.debug("Unable to create hard link for %s (%s), copying files instead", source, ex)
+                self._link_files = False
+        shutil.copy2(source, destination)
 
 
 def convert_files_to_unix_line_endings(path: str, target_files: Optional[List[str]] = None) -> None:
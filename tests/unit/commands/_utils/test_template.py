@@ -1,5 +1,7 @@
 import copy
+import json
 import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import patch, mock_open, MagicMock
 
@@ -238,9 +240,10 @@ class Test_update_relative_paths(TestCase):
 
 
 class Test_move_template(TestCase):
+    @patch("samcli.commands._utils.template.os.replace")
     @patch("samcli.commands._utils.template._update_relative_paths")
     @patch("samcli.commands._utils.template.yaml_dump")
-    def test_must_update_and_write_template(self, yaml_dump_mock, update_relative_paths_mock):
+    def test_must_update_and_write_template(self, yaml_dump_mock, update_relative_paths_mock, replace_mock):
         template_dict = {"a": "b"}
 
         # Moving from /tmp/original/root/template.yaml to /tmp/new/root/othertemplate.yaml
@@ -258,9 +261,62 @@ class Test_move_template(TestCase):
             template_dict, os.path.dirname(source), os.path.dirname(dest)
         )
         yaml_dump_mock.assert_called_with(modified_template)
-        m.assert_called_with(dest, "w")
+        m.assert_called_with(dest + ".tmp", "w")
+        replace_mock.assert_called_once_with(dest + ".tmp", dest)
         m.return_value.write.assert_called_with(dumped_yaml)
 
+    @patch("samcli.commands._utils.template.os.replace")
+    @patch("samcli.commands._utils.template._update_relative_paths")
+    @patch("samcli.commands._utils.template.yaml_dump")
+    def test_must_write_json_template(self, yaml_dump_mock, update_relative_paths_mock, replace_mock):
+        template_dict = {"a": "b"}
+
+        source = os.path.join("/", "tmp", "original", "root", "template.yaml")
+        dest = os.path.join("/", "tmp", "new", "root", "othertemplate.json")
+
+        update_relative_paths_mock.return_value = {"Resources": {"Ä": "b"}}
+
+        m = mock_open()
+        with patch("samcli.commands._utils.template.open", m):
+            move_template(source, dest, template_dict)
+
+        yaml_dump_mock.assert_not_called()
+        m.assert_called_with(dest + ".tmp", "w")
+        replace_mock.assert_called_once_with(dest + ".tmp", dest)
+        m.return_value.write.assert_called_with(json.dumps({"Resources": {"Ä": "b"}}, indent=4))
+        # non-ASCII characters are escaped, so the template can be written with any locale encoding
+        self.assertIn("\\u00c4", m.return_value.write.call_args[0][0])
+
+    def test_must_replace_existing_template(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "template.yaml")
+            dest = os.path.join(temp_dir, "build", "template.json")
+            os.makedirs(os.path.dirname(dest))
+            with open(dest, "w") as fp:
+                fp.write("previous template")
+
+            move_template(source, dest, {"Resources": {}})
+
+            with open(dest) as fp:
+                self.assertEqual(json.loads(fp.read()), {"Resources": {}})
+            self.assertEqual(os.listdir(os.path.dirname(dest)), ["template.json"])
+
+    def test_must_remove_temporary_template_when_replace_fails(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = os.path.join(temp_dir, "template.yaml")
+            dest = os.path.join(temp_dir, "build", "template.json")
+            os.makedirs(os.path.dirname(dest))
+            with open(dest, "w") as fp:
+                fp.write("previous template")
+
+            with patch("samcli.commands._utils.template.os.replace", side_effect=OSError("replace failed")):
+                with self.assertRaises(OSError):
+                    move_template(source, dest, {"Resources": {}})
+
+            with open(dest) as fp:
+                self.assertEqual(fp.read(), "previous template")
+            self.assertEqual(os.listdir(os.path.dirname(dest)), ["template.json"])
+
 
 class Test_get_template_artifacts_format(TestCase):
     @patch("samcli.commands._utils.template.get_template_data")
@@ -1,18 +1,27 @@
 import os
 from unittest import TestCase
-from unittest.mock import Mock, patch, ANY, call
+from unittest.mock import Mock, patch, ANY
 
 from parameterized import parameterized
 
 from samcli.lib.bootstrap.nested_stack.nested_stack_manager import (
     NESTED_STACK_NAME,
+    LAYER_MANIFEST_FILE_SUFFIX,
     NestedStackManager,
+    _ZIP_FUNCTIONS_CACHE,
 )
 from samcli.lib.build.app_builder import ApplicationBuildResult
-from samcli.lib.sync.exceptions import InvalidRuntimeDefinitionForFunction
+from samcli.lib.sync.exceptions import InvalidLayersDefinitionForFunction, InvalidRuntimeDefinitionForFunction
 from samcli.lib.utils import osutils
 from samcli.lib.utils.osutils import BUILD_DIR_PERMISSIONS
 from samcli.lib.utils.resources import AWS_SQS_QUEUE, AWS_SERVERLESS_FUNCTION
+from samcli.yamlhelper import yaml_dump, yaml_parse
+
+
+def _function_build_definition(function_name, dependencies_dir):
+    function = Mock()
+    function.name = function_name
+    return Mock(dependencies_dir=dependencies_dir, functions=[function])
 
 
 class TestNestedStackManager(TestCase):
@@ -20,6 +29,7 @@ class TestNestedStackManager(TestCase):
         self.stack_name = "stack_name"
         self.build_dir = "build_dir"
         self.stack_location = "stack_location"
+        _ZIP_FUNCTIONS_CACHE.clear()
 
     def test_nothing_to_add(self):
         template = {}
@@ -78,7 +88,7 @@ class TestNestedStackManager(TestCase):
             "Resources": {"MyFunction": {"Type": AWS_SERVERLESS_FUNCTION, "Properties": {"Runtime": "python3.8"}}}
         }
         build_graph = Mock()
-        build_graph.get_function_build_definition_with_logical_id.return_value = None
+        build_graph.get_function_build_definitions.return_value = []
         app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
         nested_stack_manager = NestedStackManager(
             self.stack_name, self.build_dir, self.stack_location, template, app_build_result
@@ -96,25 +106,21 @@ class TestNestedStackManager(TestCase):
         }
 
         # prepare build graph
-        dependencies_dir = Mock()
-        function = Mock()
-        function.name = "MyFunction"
-        functions = [function]
         build_graph = Mock()
-        function_definition_mock = Mock(dependencies_dir=dependencies_dir, functions=functions)
-        build_graph.get_function_build_definition_with_logical_id.return_value = function_definition_mock
+        build_graph.get_function_build_definitions.return_value = [
+            _function_build_definition("MyFunction", "dependencies_dir")
+        ]
         app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
         patched_isdir.return_value = True
 
-        nested_stack_manager = NestedStackManager(
-            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
-        )
-
-        with patch.object(nested_stack_manager, "_add_layer_readme_info") as patched_add_readme:
+        with osutils.mkdir_temp() as build_dir, patch.object(NestedStackManager, "_add_layer_readme_info"):
+            nested_stack_manager = NestedStackManager(
+                self.stack_name, build_dir, self.stack_location, template, app_build_result
+            )
             result = nested_stack_manager.generate_auto_dependency_layer_stack()
 
             patched_move_template.assert_called_with(
-                self.stack_location, os.path.join(self.build_dir, "nested_template.yaml"), ANY
+                self.stack_location, os.path.join(build_dir, "nested_template.json"), ANY
             )
             self.assertNotEqual(template, result)
 
@@ -123,22 +129,205 @@ class TestNestedStackManager(TestCase):
 
             self.assertTrue(resources.get("MyFunction", {}).get("Properties", {}).get("Layers", []))
 
+            # original template should stay untouched
+            self.assertNotIn(NESTED_STACK_NAME, template.get("Resources", {}).keys())
+            self.assertNotIn("Layers", template.get("Resources", {}).get("MyFunction", {}).get("Properties", {}))
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.move_template")
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.NestedStackManager.update_layer_folder")
+    def test_with_mixed_key_types_in_template(self, patched_update_layer_folder, patched_move_template):
+        # YAML parses unquoted numeric keys as int
+        template = {
+            "Mappings": {"Accounts": {123456789012: {"Env": "prod"}, "dev": {"Env": "dev"}}},
+            "Resources": {"MyFunction": {"Type": AWS_SERVERLESS_FUNCTION, "Properties": {"Runtime": "python3.8"}}},
+        }
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [_function_build_definition("MyFunction", "deps")]
+        app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
+        patched_update_layer_folder.return_value = "layer_folder"
+
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+        )
+        result = nested_stack_manager.generate_auto_dependency_layer_stack()
+
+        self.assertIn(NESTED_STACK_NAME, result["Resources"])
+        self.assertEqual(len(result["Resources"]["MyFunction"]["Properties"]["Layers"]), 1)
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.move_template")
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.NestedStackManager.update_layer_folder")
+    def test_keeps_key_order_of_parsed_template(self, patched_update_layer_folder, patched_move_template):
+        template = yaml_parse(
+            """
+Transform: AWS::Serverless-2016-10-31
+Resources:
+  MyFunction:
+    Type: AWS::Serverless::Function
+    Properties:
+      Runtime: python3.8
+      Handler: app.handler
+  AnotherQueue:
+    Type: AWS::SQS::Queue
+"""
+        )
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [_function_build_definition("MyFunction", "deps")]
+        app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
+        patched_update_layer_folder.return_value = "layer_folder"
+
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+        )
+        result = yaml_dump(nested_stack_manager.generate_auto_dependency_layer_stack())
+
+        self.assertLess(result.index("Transform:"), result.index("Resources:"))
+        self.assertLess(result.index("MyFunction:"), result.index("AnotherQueue:"))
+        self.assertLess(result.index("AnotherQueue:"), result.index(f"{NESTED_STACK_NAME}:"))
+        # updated function keeps its key order as well
+        self.assertLess(result.index("Type: AWS::Serverless::Function"), result.index("Properties:"))
+        self.assertLess(result.index("Runtime:"), result.index("Handler:"))
+        self.assertLess(result.index("Handler:"), result.index("Layers:"))
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.move_template")
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.NestedStackManager.update_layer_folder")
+    def test_raise_exception_when_layers_is_not_a_list(self, patched_update_layer_folder, patched_move_template):
+        layers = {"Fn::If": ["HasLayers", ["layer_arn"], {"Ref": "AWS::NoValue"}]}
+        template = {
+            "Resources": {
+                "MyFunction": {
+                    "Type": AWS_SERVERLESS_FUNCTION,
+                    "Properties": {"Runtime": "python3.8", "Layers": layers},
+                }
+            }
+        }
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [_function_build_definition("MyFunction", "deps")]
+        app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
+        patched_update_layer_folder.return_value = "layer_folder"
+
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+        )
+        with self.assertRaises(InvalidLayersDefinitionForFunction):
+            nested_stack_manager.generate_auto_dependency_layer_stack()
+
+        self.assertEqual(template["Resources"]["MyFunction"]["Properties"]["Layers"], layers)
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.move_template")
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.NestedStackManager.update_layer_folder")
+    def test_with_zip_function_without_properties(self, patched_update_layer_folder, patched_move_template):
+        template = {
+            "Globals": {"Function": {"Runtime": "python3.8", "Layers": ["existing_layer_arn"]}},
+            "Resources": {"MyFunction": {"Type": AWS_SERVERLESS_FUNCTION}},
+        }
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [_function_build_definition("MyFunction", "deps")]
+        app_build_result = ApplicationBuildResult(build_graph, {"MyFunction": "path/to/build/dir"})
+        patched_update_layer_folder.return_value = "layer_folder"
+
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+        )
+        result = nested_stack_manager.generate_auto_dependency_layer_stack()
+
+        self.assertEqual(len(result["Resources"]["MyFunction"]["Properties"]["Layers"]), 1)
+        self.assertNotIn("Properties", template["Resources"]["MyFunction"])
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.move_template")
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.NestedStackManager.update_layer_folder")
+    def test_with_multiple_zip_functions(self, patched_update_layer_folder, patched_move_template):
+        function_names = [f"MyFunction{index}" for index in range(10)]
+        template = {
+            "Resources": {
+                function_name: {"Type": AWS_SERVERLESS_FUNCTION, "Properties": {"Runtime": "python3.8"}}
+                for function_name in function_names
+            }
+        }
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [
+            _function_build_definition(function_name, f"deps/{function_name}") for function_name in function_names
+        ]
+        app_build_result = ApplicationBuildResult(
+            build_graph, {function_name: "path/to/build/dir" for function_name in function_names}
+        )
+        patched_update_layer_folder.side_effect = lambda build_dir, dependencies_dir, *_: f"layer/{dependencies_dir}"
+
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+        )
+        result = nested_stack_manager.generate_auto_dependency_layer_stack()
+
+        self.assertEqual(patched_update_layer_folder.call_count, len(function_names))
+        nested_template = patched_move_template.call_args[0][2]
+        self.assertEqual(
+            [layer["Properties"]["ContentUri"] for layer in nested_template["Resources"].values()],
+            [f"layer/deps/{function_name}" for function_name in function_names],
+        )
+        for function_name in function_names:
+            self.assertEqual(len(result["Resources"][function_name]["Properties"]["Layers"]), 1)
+
+    @patch("samcli.lib.bootstrap.nested_stack.nested_stack_manager.SamFunctionProvider")
+    def test_zip_functions_cached_for_same_template(self, patched_function_provider):
+        template = {
+            "Resources": {"MyFunction": {"Type": AWS_SERVERLESS_FUNCTION, "Properties": {"Runtime": "python3.8"}}}
+        }
+        zip_function = Mock(packagetype="Zip")
+        image_function = Mock(packagetype="Image")
+        patched_function_provider.return_value.get_all.return_value = [zip_function, image_function]
+        app_build_result = ApplicationBuildResult(Mock(), {})
+
+        for _ in range(2):
+            nested_stack_manager = NestedStackManager(
+                self.stack_name, self.build_dir, self.stack_location, template, app_build_result
+            )
+            self.assertEqual(nested_stack_manager._get_zip_functions(), (zip_function,))
+        patched_function_provider.assert_called_once()
+
+        # template is updated in place, functions are discovered again for the new template
+        template["Resources"]["MyFunction"]["Properties"]["Runtime"] = "python3.9"
+        nested_stack_manager._get_zip_functions()
+        self.assertEqual(patched_function_provider.call_count, 2)
+
+    def test_add_layer_references(self):
+        original_function = {"Type": AWS_SERVERLESS_FUNCTION, "Properties": {"Layers": ["existing_layer_arn"]}}
+        resources = {"MyFunction": original_function}
+        layer_references = [{"Fn::GetAtt": [NESTED_STACK_NAME, "Outputs.Layer1"]}, {"Ref": "Layer2"}]
+
+        NestedStackManager._add_layer_references("MyFunction", layer_references, resources)
+
+        self.assertEqual(resources["MyFunction"]["Properties"]["Layers"], ["existing_layer_arn"] + layer_references)
+        self.assertEqual(original_function["Properties"]["Layers"], ["existing_layer_arn"])
+
+    def test_get_dependencies_dir(self):
+        build_graph = Mock()
+        build_graph.get_function_build_definitions.return_value = [
+            _function_build_definition("MyFunction", "deps"),
+            _function_build_definition("MyOtherFunction", "other_deps"),
+        ]
+        app_build_result = ApplicationBuildResult(build_graph, {})
+        nested_stack_manager = NestedStackManager(
+            self.stack_name, self.build_dir, self.stack_location, {}, app_build_result
+        )
+
+        self.assertEqual(nested_stack_manager._get_dependencies_dir("MyFunction"), "deps")
+        self.assertEqual(nested_stack_manager._get_dependencies_dir("MyOtherFunction"), "other_deps")
+        self.assertIsNone(nested_stack_manager._get_dependencies_dir("UnknownFunction"))
+        build_graph.get_function_build_definitions.assert_called_once()
+
     def test_adding_readme_file(self):
-        with patch("builtins.open") as patched_open:
-            dependencies_dir = "dependencies"
+        with osutils.mkdir_temp() as dependencies_dir:
+            readme_file = os.path.join(dependencies_dir, "AWS_SAM_CLI_README")
+            with open(readme_file, "w") as f:
+                f.write("previous content which is longer than the new content" * 10)
+
             function_name = "function_name"
             NestedStackManager._add_layer_readme_info(dependencies_dir, function_name)
-            patched_open.assert_has_calls(
-                [
-                    call(os.path.join(dependencies_dir, "AWS_SAM_CLI_README"), "w+"),
-                    call()
-                    .__enter__()
-                    .write(
-                        f"This layer contains dependencies of function {function_name} and automatically added by AWS SAM CLI command 'sam sync'"
-                    ),
-                ],
-                any_order=True,
-            )
+
+            with open(readme_file) as f:
+                self.assertEqual(
+                    f.read(),
+                    f"This layer contains dependencies of function {function_name} and automatically added by AWS SAM CLI command 'sam sync'",
+                )
 
     def test_update_layer_folder_raise_exception_with_no_runtime(self):
         with self.assertRaises(InvalidRuntimeDefinitionForFunction):
@@ -162,7 +351,11 @@ class TestNestedStackManager(TestCase):
         layer_root_folder = Mock()
         layer_root_folder.exists.return_value = True
         layer_root_folder.joinpath.return_value = layer_contents_folder
-        patched_path.return_value.joinpath.return_value = layer_root_folder
+        manifest_file = Mock()
+        manifest_file.exists.return_value = False
+        patched_path.return_value.joinpath.side_effect = lambda name: (
+            manifest_file if name.endswith(LAYER_MANIFEST_FILE_SUFFIX) else layer_root_folder
+        )
         patched_isdir.return_value = True
 
         layer_folder = NestedStackManager.update_layer_folder(
@@ -171,7 +364,9 @@ class TestNestedStackManager(TestCase):
 
         patched_shutil.rmtree.assert_called_with(layer_root_folder)
         layer_contents_folder.mkdir.assert_called_with(BUILD_DIR_PERMISSIONS, parents=True)
-        patched_osutils.copytree.assert_called_with(dependencies_dir, str(layer_contents_folder))
+        patched_osutils.copytree.assert_called_with(
+            dependencies_dir, str(layer_contents_folder), copy_function=patched_osutils.FileLinker.return_value
+        )
         patched_add_layer_readme.assert_called_with(str(layer_root_folder), function_logical_id)
         self.assertEqual(layer_folder, str(layer_root_folder))
 
@@ -193,7 +388,11 @@ class TestNestedStackManager(TestCase):
         layer_root_folder = Mock()
         layer_root_folder.exists.return_value = True
         layer_root_folder.joinpath.return_value = layer_contents_folder
-        patched_path.return_value.joinpath.return_value = layer_root_folder
+        manifest_file = Mock()
+        manifest_file.exists.return_value = False
+        patched_path.return_value.joinpath.side_effect = lambda name: (
+            manifest_file if name.endswith(LAYER_MANIFEST_FILE_SUFFIX) else layer_root_folder
+        )
 
         patched_isdir.return_value = False
 
@@ -202,6 +401,96 @@ class TestNestedStackManager(TestCase):
         )
         patched_osutils.copytree.assert_not_called()
 
-    @parameterized.expand([("python3.8", True), ("ruby2.7", False)])
+    def test_update_layer_folder_updates_only_changed_dependencies(self):
+        with osutils.mkdir_temp() as build_dir, osutils.mkdir_temp() as dependencies_dir:
+
+            def write_dependency(relative_path, content):
+                file_path = os.path.join(dependencies_dir, relative_path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, "w") as f:
+                    f.write(content)
+
+            def update_layer_folder(runtime="python3.9"):
+                return NestedStackManager.update_layer_folder(
+                    build_dir, dependencies_dir, "layer_logical_id", "function_logical_id", runtime
+                )
+
+            write_dependency("unchanged.py", "unchanged")
+            write_dependency("changed.py", "content")
+            write_dependency(os.path.join("removed", "package", "removed.py"), "removed")
+
+            layer_folder = update_layer_folder()
+            layer_contents_folder = os.path.join(layer_folder, "python")
+            self.assertTrue(os.path.isfile(os.path.join(layer_contents_folder, "unchanged.py")))
+            self.assertTrue(os.path.isfile(os.path.join(layer_contents_folder, "removed", "package", "removed.py")))
+            self.assertTrue(os.path.isfile(os.path.join(layer_folder, "AWS_SAM_CLI_README")))
+            self.assertTrue(os.path.isfile(os.path.join(build_dir, f"layer_logical_id{LAYER_MANIFEST_FILE_SUFFIX}")))
+
+            # nothing changed
+            with patch.object(osutils, "copytree") as patched_copytree, patch.object(
+                osutils, "FileLinker"
+            ) as patched_file_linker:
+                self.assertEqual(update_layer_folder(), layer_folder)
+                patched_copytree.assert_not_called()
+                patched_file_linker.assert_not_called()
+
+            os.remove(os.path.join(dependencies_dir, "changed.py"))
+            write_dependency("changed.py", "new content")
+            os.remove(os.path.join(dependencies_dir, "removed", "package", "removed.py"))
+            write_dependency("added.py", "added")
+
+            with patch.object(osutils, "copytree") as patched_copytree, patch(
+                "samcli.lib.utils.osutils.os.link", wraps=os.link
+            ) as patched_link:
+                update_layer_folder()
+                patched_copytree.assert_not_called()
+                self.assertEqual(patched_link.call_count, 2)
+
+            with open(os.path.join(layer_contents_folder, "changed.py")) as f:
+                self.assertEqual(f.read(), "new content")
+            self.assertTrue(os.path.isfile(os.path.join(layer_contents_folder, "added.py")))
+            self.assertFalse(os.path.exists(os.path.join(layer_contents_folder, "removed")))
+
+            # layer sub folder changes with the runtime, layer folder is re-created
+            update_layer_folder("nodejs14.x")
+            self.assertFalse(os.path.exists(layer_contents_folder))
+            self.assertTrue(os.path.isfile(os.path.join(layer_folder, "nodejs", "changed.py")))
+
+    def test_update_layer_folder_updates_replaced_dependency_with_same_size_and_mtime(self):
+        with osutils.mkdir_temp() as build_dir, osutils.mkdir_temp() as dependencies_dir:
+            dependency_path = os.path.join(dependencies_dir, "replaced.py")
+            with open(dependency_path, "w") as f:
+                f.write("old")
+            original_stat = os.stat(dependency_path)
+
+            layer_folder = NestedStackManager.update_layer_folder(
+                build_dir, dependencies_dir, "layer_logical_id", "function_logical_id", "python3.9"
+            )
+
+            # replace the file with a new one, which has the same size and modification time
+            replacement_path = os.path.join(dependencies_dir, "replacement")
+            with open(replacement_path, "w") as f:
+                f.write("new")
+            os.utime(replacement_path, ns=(original_stat.st_atime_ns, original_stat.st_mtime_ns))
+            os.replace(replacement_path, dependency_path)
+
+            NestedStackManager.update_layer_folder(
+                build_dir, dependencies_dir, "layer_logical_id", "function_logical_id", "python3.9"
+            )
+
+            with open(os.path.join(layer_folder, "python", "replaced.py")) as f:
+                self.assertEqual(f.read(), "new")
+
+    @parameterized.expand(
+        [
+            ("python3.8", True),
+            ("nodejs14.x", True),
+            ("java8.al2", True),
+            ("ruby2.7", False),
+            ("provided.python", False),
+            ("", False),
+            (None, False),
+        ]
+    )
     def test_is_runtime_supported(self, runtime, supported):
         self.assertEqual(NestedStackManager.is_runtime_supported(runtime), supported)
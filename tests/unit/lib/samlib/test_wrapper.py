@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from datetime import date
+from unittest import TestCase
+
+from samcli.lib.samlib.wrapper import _naive_deepcopy, SamTranslatorWrapper
+
+
+class TestNaiveDeepcopy(TestCase):
+    def test_copies_nested_containers(self):
+        template = OrderedDict(
+            [
+                ("Resources", OrderedDict([("MyFunction", {"Properties": {"Layers": ["arn"], "MemorySize": 128}})])),
+                ("Conditions", {"IsProd": {"Fn::Equals": [True, None, 1.5]}}),
+            ]
+        )
+
+        copied = _naive_deepcopy(template)
+
+        self.assertEqual(copied, template)
+        self.assertIs(type(copied), OrderedDict)
+        self.assertIs(type(copied["Resources"]), OrderedDict)
+        self.assertIsNot(copied["Resources"], template["Resources"])
+        self.assertIsNot(copied["Resources"]["MyFunction"], template["Resources"]["MyFunction"])
+        self.assertIsNot(
+            copied["Resources"]["MyFunction"]["Properties"]["Layers"],
+            template["Resources"]["MyFunction"]["Properties"]["Layers"],
+        )
+
+    def test_falls_back_to_deepcopy_for_other_types(self):
+        value = {"Date": date(2021, 11, 1), "Set": {1, 2}}
+
+        copied = _naive_deepcopy(value)
+
+        self.assertEqual(copied, value)
+        self.assertIsNot(copied["Set"], value["Set"])
+
+    def test_template_is_a_copy(self):
+        template = {"Resources": {"MyFunction": {"Properties": {}}}}
+        wrapper = SamTranslatorWrapper(template)
+
+        copied = wrapper.template
+        copied["Resources"]["MyFunction"]["Properties"]["Layers"] = []
+
+        self.assertEqual(template, {"Resources": {"MyFunction": {"Properties": {}}}})
@@ -6,6 +6,7 @@ from samcli.lib.sync.exceptions import (
     SyncFlowException,
     MissingFunctionBuildDefinition,
     InvalidRuntimeDefinitionForFunction,
+    InvalidLayersDefinitionForFunction,
 )
 
 
@@ -48,3 +49,10 @@ class TestInvalidRuntimeDefinitionForFunction(TestCase):
         function_logical_id = "function_logical_id"
         exception = InvalidRuntimeDefinitionForFunction(function_logical_id)
         self.assertEqual(exception.function_logical_id, function_logical_id)
+
+
+class TestInvalidLayersDefinitionForFunction(TestCase):
+    def test_exception(self):
+        function_logical_id = "function_logical_id"
+        exception = InvalidLayersDefinitionForFunction(function_logical_id)
+        self.assertEqual(exception.function_logical_id, function_logical_id)
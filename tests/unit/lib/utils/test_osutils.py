@@ -3,6 +3,7 @@ Tests OSUtils file
 """
 
 import os
+import shutil
 import sys
 
 from unittest import TestCase
@@ -77,3 +78,59 @@ class Test_convert_files_to_unix_line_endings:
         patched_open.assert_any_call(os.path.join("b", target_file), "rb")
         patched_open.assert_any_call(os.path.join("a", target_file), "wb")
         patched_open.assert_any_call(os.path.join("b", target_file), "wb")
+
+
+class Test_copytree(TestCase):
+    def _create_source(self, root):
+        os.makedirs(os.path.join(root, "a", "b"))
+        with open(os.path.join(root, "file_1"), "w") as f:
+            f.write("content 1")
+        with open(os.path.join(root, "a", "b", "file_2"), "w") as f:
+            f.write("content 2" * 1000)
+
+    def _assert_copied(self, destination):
+        with open(os.path.join(destination, "file_1")) as f:
+            self.assertEqual(f.read(), "content 1")
+        with open(os.path.join(destination, "a", "b", "file_2")) as f:
+            self.assertEqual(f.read(), "content 2" * 1000)
+
+    def test_copies_folder_contents(self):
+        with osutils.mkdir_temp() as source, osutils.mkdir_temp() as destination_root:
+            self._create_source(source)
+            destination = os.path.join(destination_root, "destination")
+
+            osutils.copytree(source, destination)
+
+            self._assert_copied(destination)
+
+    def test_skips_ignored_names(self):
+        with osutils.mkdir_temp() as source, osutils.mkdir_temp() as destination:
+            self._create_source(source)
+
+            osutils.copytree(source, destination, ignore=shutil.ignore_patterns("b"))
+
+            self.assertTrue(os.path.isfile(os.path.join(destination, "file_1")))
+            self.assertTrue(os.path.isdir(os.path.join(destination, "a")))
+            self.assertFalse(os.path.exists(os.path.join(destination, "a", "b")))
+
+    def test_links_files(self):
+        with osutils.mkdir_temp() as source, osutils.mkdir_temp() as destination:
+            self._create_source(source)
+
+            osutils.copytree(source, destination, copy_function=osutils.FileLinker())
+
+            self._assert_copied(destination)
+            self.assertTrue(os.path.samefile(os.path.join(source, "file_1"), os.path.join(destination, "file_1")))
+
+    @patch("samcli.lib.utils.osutils.os.link")
+    def test_copies_files_when_link_fails(self, patched_link):
+        patched_link.side_effect = OSError("cross-device link")
+        with osutils.mkdir_temp() as source, osutils.mkdir_temp() as destination:
+            self._create_source(source)
+
+            osutils.copytree(source, destination, copy_function=osutils.FileLinker())
+
+            self._assert_copied(destination)
+            self.assertFalse(os.path.samefile(os.path.join(source, "file_1"), os.path.join(destination, "file_1")))
+            # linking is not tried again after the first failure
+            patched_link.assert_called_once()